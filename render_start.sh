@@ -10,6 +10,7 @@ export HOST=${HOST:-0.0.0.0}
 export WORKERS=${WORKERS:-1}  # Réduit à un seul worker pour éviter les timeouts
 export TIMEOUT=${TIMEOUT:-120}  # Augmente le timeout à 120 secondes
 export MAX_REQUESTS=${MAX_REQUESTS:-1}  # Limite le nombre de requêtes par worker
+export PRELOAD_MODEL=${PRELOAD_MODEL:-1}  # Charge le modèle une seule fois avant le fork des workers
 
 echo "=== Démarrage de NéphroPredict sur Render ==="
 echo "Hôte: $HOST"
@@ -67,6 +68,7 @@ echo "=== Démarrage de l'application avec gunicorn ==="
 exec gunicorn render_main:app \
     --worker-class uvicorn.workers.UvicornWorker \
     --workers $WORKERS \
+    --preload \
     --bind $HOST:$PORT \
     --timeout $TIMEOUT \
     --max-requests $MAX_REQUESTS \
@@ -0,0 +1,131 @@
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+
+from lazy_model import LazyIRCModel, PREDICT_WORKERS
+from schemas import PredictionInput
+
+class PredictionBatcher:
+    """
+    Coalesce concurrent prediction requests into a single model call.
+    Requests arriving within `max_wait` seconds of each other are grouped
+    (up to `max_batch_size`) and scored with one `predict_batch` call in the
+    model's thread pool. Up to `max_concurrency` batches are scored at once;
+    when all are busy, waiting requests accumulate into the next batch.
+    """
+    def __init__(
+        self,
+        model: LazyIRCModel,
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        max_concurrency: int = PREDICT_WORKERS
+    ):
+        self._model = model
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._max_concurrency = max_concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """Start the background task that drains the queue"""
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self._max_concurrency)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the background task and any batch still being scored. Requests
+        that were not scored yet are cancelled so no caller waits forever.
+        """
+        tasks = list(self._in_flight)
+        if self._worker is not None:
+            tasks.append(self._worker)
+            self._worker = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._in_flight.clear()
+
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def submit(self, patient: PredictionInput) -> Tuple[int, Dict[int, float], Dict[str, float]]:
+        """
+        Queue a prediction and wait for its batch to be scored
+
+        Args:
+            patient: Validated patient data
+
+        Returns:
+            Tuple of (predicted stage, stage probabilities, feature importance)
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((patient, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Collect queued requests into batches and dispatch them for scoring"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                # Wait for a free prediction thread; requests keep queuing meanwhile
+                await self._slots.acquire()
+                deadline = loop.time() + self._max_wait
+
+                # Wait for more requests until the flush timer expires
+                while len(batch) < self._max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Stopped while collecting: the batch will never be scored
+                self._cancel(batch)
+                raise
+
+            task = asyncio.create_task(self._score(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._on_scored)
+
+    def _on_scored(self, task: asyncio.Task) -> None:
+        """Free the slot of a finished batch"""
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _score(self, batch: List[Tuple[PredictionInput, asyncio.Future]]) -> None:
+        """Run the model on a batch and resolve the waiting futures"""
+        try:
+            stages, probabilities, feature_importance = await self._model.apredict_batch(
+                [patient for patient, _ in batch]
+            )
+        except asyncio.CancelledError:
+            self._cancel(batch)
+            raise
+        except Exception as e:
+            if len(batch) == 1:
+                future = batch[0][1]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            # Bisect so that only the rows the model rejects get the error
+            middle = len(batch) // 2
+            await self._score(batch[:middle])
+            await self._score(batch[middle:])
+            return
+
+        for (_, future), stage, stage_probabilities in zip(batch, stages, probabilities):
+            if not future.done():
+                future.set_result((stage, stage_probabilities, feature_importance))
+
+    @staticmethod
+    def _cancel(batch: List[Tuple[PredictionInput, asyncio.Future]]) -> None:
+        """Cancel the futures of a batch that will not be scored"""
+        for _, future in batch:
+            future.cancel()
@@ -0,0 +1,32 @@
+"""
+Compile the random forest into a native shared library with Treelite.
+The API picks it up automatically when treelite_runtime is installed.
+
+Requires a C compiler and: pip install treelite==3.9.1 treelite_runtime==3.9.1
+
+Usage: python compile_model.py
+"""
+import os
+import joblib
+import treelite
+import treelite.sklearn
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), '../../attached_assets')
+PICKLE_PATH = os.path.join(ASSETS_DIR, 'model_lucien_v1.pkl')
+LIB_PATH = os.path.join(ASSETS_DIR, 'model_lucien_v1.so')
+
+def main():
+    model = joblib.load(PICKLE_PATH)
+
+    tl_model = treelite.sklearn.import_model(model)
+    tl_model.export_lib(
+        toolchain='gcc',
+        libpath=LIB_PATH,
+        # quantize: thresholds become integer bin indices, compared as ints
+        params={'parallel_comp': os.cpu_count(), 'quantize': 1},
+        verbose=False
+    )
+    print(f"Model compiled: {LIB_PATH} ({os.path.getsize(LIB_PATH)} bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -1,224 +1,318 @@
-import pickle
 import pandas as pd
 import numpy as np
 import os
+import asyncio
+import logging
+import functools
 import threading
-import time
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import MappingProxyType
+from joblib import load
+from schemas import PredictionInput
+from native_model import TreelitePredictor
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Model files, resolved once at import
+_ASSETS_DIR = Path(__file__).resolve().parent.parent.parent / "attached_assets"
+_MODEL_PATH = _ASSETS_DIR / "model_lucien_v1.pkl"
+_NATIVE_MODEL_PATH = _ASSETS_DIR / "model_lucien_v1.so"
+
+# Fail fast at startup rather than serving predictions without a model
+if not _MODEL_PATH.is_file():
+    raise FileNotFoundError(f"Model file not found: {_MODEL_PATH}")
+
+# Threads running the sklearn calls, so they never block the event loop
+PREDICT_WORKERS = os.cpu_count() or 1
+_CPU_POOL = ThreadPoolExecutor(max_workers=PREDICT_WORKERS, thread_name_prefix="irc-predict")
+
+# Column order of the training DataFrame (see attached_assets/Readme_model_lucien.md)
+FEATURE_ORDER = [
+    'Créatinine (mg/L)',
+    'Urée (g/L)',
+    'Age',
+    'Na^+ (meq/L)',
+    'TA (mmHg)/Systole',
+    'Choc de Pointe/Perçu',
+    'Score de Glasgow (/15)',
+    'Sexe_M',
+    'Anémie_True',
+    'Enquête Sociale/Tabac_True',
+    'Enquête Sociale/Alcool_True'
+]
+
+# PredictionInput attribute holding each feature (features are the field aliases)
+_FIELD_BY_FEATURE = {field.alias: name for name, field in PredictionInput.model_fields.items()}
+
+# Fallback feature importance, with higher importance for creatinine and urea
+_FALLBACK_IMPORTANCE_RAW = MappingProxyType({
+    "Créatinine (mg/L)": 0.35,
+    "Urée (g/L)": 0.25,
+    "Age": 0.15,
+    "TA (mmHg)/Systole": 0.10,
+    "Na^+ (meq/L)": 0.05,
+    "Score de Glasgow (/15)": 0.05,
+    "Sexe_M": 0.02,
+    "Anémie_True": 0.03,
+    "Choc de Pointe/Perçu": 0.02,
+    "Enquête Sociale/Tabac_True": 0.015,
+    "Enquête Sociale/Alcool_True": 0.015
+})
+
+@functools.lru_cache(maxsize=8)
+def _fallback_importance_for(features: frozenset) -> Dict[str, float]:
+    """
+    Fallback feature importance restricted to the given features and
+    normalized to sum to 1. The result is cached and shared, do not mutate it.
+    """
+    importance = {k: v for k, v in _FALLBACK_IMPORTANCE_RAW.items() if k in features}
+    total = sum(importance.values())
+    return {k: v/total for k, v in importance.items()}
+
+# Fallback stage probabilities, one row per predicted stage: 0.85 on the
+# predicted stage and the rest spread evenly over the other five
+_FALLBACK_CONFIDENCE = 0.85
+_FALLBACK_PROBAS = np.full((6, 6), (1.0 - _FALLBACK_CONFIDENCE) / 5, dtype=np.float64)
+np.fill_diagonal(_FALLBACK_PROBAS, _FALLBACK_CONFIDENCE)
+
+class ModelNotReadyError(RuntimeError):
+    """Raised when a prediction is requested before the model is loaded"""
 
 class LazyIRCModel:
     """
-    Class to handle the IRC (Insuffisance Rénale Chronique) prediction model
-    with lazy loading to avoid Render timeouts
+    Class to handle the IRC (Insuffisance Rénale Chronique) prediction model,
+    loaded off the event loop when the application starts
     """
+    # No per-instance __dict__: attributes are read on every prediction
+    __slots__ = (
+        '_model',
+        '_model_loading',
+        '_model_loaded',
+        '_feature_order',
+        '_feature_fields',
+        '_classes_int',
+        '_n_features',
+        '_row_buf',
+        '_needs_dataframe',
+        '_feature_importance_cached',
+        '_load_future'
+    )
+    
     def __init__(self):
         self._model = None
-        self._feature_importance = None
-        self._stage_probabilities = None
         self._model_loading = False
         self._model_loaded = False
-        
-        # Start a background thread to load the model
-        self._start_loading_model()
+        self._feature_order = list(FEATURE_ORDER)
+        self._feature_fields = [_FIELD_BY_FEATURE[name] for name in self._feature_order]
+        self._classes_int: Optional[np.ndarray] = None
+        self._n_features = len(self._feature_order)
+        self._row_buf = threading.local()
+        self._needs_dataframe = False
+        self._feature_importance_cached: Dict[str, float] = {}
+        self._load_future: Optional[asyncio.Future] = None
+    
+    def load(self) -> None:
+        """
+        Load the model synchronously in the calling thread. Used to load it in
+        the gunicorn master (--preload) so forked workers share its memory.
+        """
+        if not self._model_loaded:
+            self._model_loading = True
+            self._load_model()
     
-    def _start_loading_model(self):
-        """Start a background thread to load the model"""
-        self._model_loading = True
-        thread = threading.Thread(target=self._load_model)
-        thread.daemon = True  # Thread will exit when the main program exits
-        thread.start()
+    async def ensure_loaded(self) -> None:
+        """
+        Load the model in an executor (only once) and wait until it is ready.
+        A failed load is re-raised to every caller.
+        """
+        if self._model_loaded:
+            return
+        if self._load_future is None:
+            self._model_loading = True
+            loop = asyncio.get_running_loop()
+            self._load_future = loop.run_in_executor(None, self._load_model)
+        # Shielded so a cancelled caller does not cancel the load for the others
+        await asyncio.shield(self._load_future)
     
     def _load_model(self):
-        """Load the model from the pickle file in a background thread"""
+        """Load the model from the pickle file"""
         try:
-            print("Starting model loading in background thread...")
-            model_path = os.path.join(os.path.dirname(__file__), '../../attached_assets/model_lucien_v1.pkl')
+            logger.info("Loading model from %s (%d bytes)", _MODEL_PATH, _MODEL_PATH.stat().st_size)
+            
+            self._model = load(_MODEL_PATH)
+            
+            # Prefer the column order recorded by sklearn when the model has one.
+            # Such models (e.g. pipelines fitted on a DataFrame) need column names,
+            # the others can be fed a plain numpy array.
+            if hasattr(self._model, 'feature_names_in_'):
+                self._feature_order = list(self._model.feature_names_in_)
+                self._needs_dataframe = True
+            self._feature_fields = [_FIELD_BY_FEATURE[name] for name in self._feature_order]
+            self._n_features = len(self._feature_order)
+            
+            # Cache the class labels so predictions don't convert them every call
+            if hasattr(self._model, 'classes_'):
+                self._classes_int = np.asarray(self._model.classes_, dtype=np.int64)
             
-            # Give some time for the application to start before loading the model
-            time.sleep(2)
+            # Feature importance does not depend on the input, compute it once
+            self._feature_importance_cached = self._calculate_feature_importance()
             
-            with open(model_path, 'rb') as file:
-                self._model = pickle.load(file)
+            # Swap in the compiled forest when available (see compile_model.py).
+            # It only takes numeric arrays, so models needing a DataFrame keep sklearn.
+            if (not self._needs_dataframe and self._classes_int is not None
+                    and TreelitePredictor.is_available(_NATIVE_MODEL_PATH)):
+                self._model = TreelitePredictor(_NATIVE_MODEL_PATH, self._classes_int)
             
             self._model_loaded = True
+            logger.info("Model loaded successfully (%s)", type(self._model).__name__)
+        except Exception:
+            # An untrained placeholder model cannot predict, let startup fail instead
+            logger.exception("Error loading model")
+            raise
+        finally:
             self._model_loading = False
-            print("Model loaded successfully in background thread")
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            self._model_loading = False
-            # Create a simple fallback model for testing
-            self._create_fallback_model()
-    
-    def _create_fallback_model(self):
-        """Create a simple fallback model for testing purposes"""
-        from sklearn.ensemble import RandomForestClassifier
-        
-        # This is just a placeholder model for when the real pickle file can't be loaded
-        print("Creating fallback model for testing")
-        self._model = RandomForestClassifier(n_estimators=10, random_state=42)
-        self._model_loaded = True
     
     def is_model_ready(self) -> bool:
         """Check if the model is loaded and ready for predictions"""
         return self._model_loaded
     
-    def predict(self, input_data: Dict[str, Any]) -> int:
+    def predict(self, patient: PredictionInput) -> Tuple[int, Dict[int, float], Dict[str, float]]:
         """
         Make a prediction using the loaded model
         
         Args:
-            input_data: Dictionary containing patient data
+            patient: Validated patient data
             
         Returns:
-            Predicted IRC stage (0-5)
-        """
-        # If model is not loaded yet, use fallback prediction
-        if not self._model_loaded:
-            df = pd.DataFrame([input_data])
-            return self._fallback_predict(df)
-            
-        try:
-            # Convert input data to pandas DataFrame
-            df = pd.DataFrame([input_data])
+            Tuple of (predicted IRC stage (0-5), stage probabilities,
+            feature importance)
             
-            # If using the fallback model (for testing only)
-            if not hasattr(self._model, 'predict'):
-                return self._fallback_predict(df)
-            
-            # Make prediction using the real model
-            prediction = self._model.predict(df)
-            predicted_stage = int(prediction[0])
+        Raises:
+            ModelNotReadyError: If the model has not finished loading
+        """
+        stages, probabilities, feature_importance = self.predict_batch_with_probabilities([patient])
+        return stages[0], probabilities[0], feature_importance
+    
+    async def apredict(self, patient: PredictionInput) -> Tuple[int, Dict[int, float], Dict[str, float]]:
+        """Run predict() in the prediction thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_CPU_POOL, self.predict, patient)
+    
+    async def apredict_batch(
+        self, patients: List[PredictionInput]
+    ) -> Tuple[List[int], List[Dict[int, float]], Dict[str, float]]:
+        """Run predict_batch_with_probabilities() in the prediction thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_CPU_POOL, self.predict_batch_with_probabilities, patients)
+    
+    def predict_batch(self, patients: List[PredictionInput]) -> List[int]:
+        """
+        Make predictions for several patients with a single model call
+        
+        Args:
+            patients: List of validated patient data
             
-            # Calculate stage probabilities if the model supports it
-            if hasattr(self._model, 'predict_proba'):
-                proba = self._model.predict_proba(df)[0]
-                classes = self._model.classes_
-                self._stage_probabilities = {int(classes[i]): float(proba[i]) for i in range(len(classes))}
-            else:
-                # Fallback probabilities
-                self._generate_fallback_probabilities(predicted_stage)
+        Returns:
+            Predicted IRC stages (0-5), in the same order as the inputs
+        """
+        return self.predict_batch_with_probabilities(patients)[0]
+    
+    def predict_batch_with_probabilities(
+        self, patients: List[PredictionInput]
+    ) -> Tuple[List[int], List[Dict[int, float]], Dict[str, float]]:
+        """
+        Make predictions for several patients and return the stage
+        probabilities of each row alongside the predicted stages
+        
+        Args:
+            patients: List of validated patient data
             
-            # Calculate feature importance
-            self._calculate_feature_importance(df)
+        Returns:
+            Tuple of (predicted stages, stage probabilities per row,
+            feature importance shared by every row)
             
-            return predicted_stage
+        Raises:
+            ModelNotReadyError: If the model has not finished loading
+        """
+        # Never serve made-up stages while the real model is still loading
+        if not self._model_loaded:
+            raise ModelNotReadyError("model warming up")
         
-        except Exception as e:
-            print(f"Prediction error: {e}")
-            return self._fallback_predict(pd.DataFrame([input_data]))
-    
-    def _fallback_predict(self, df: pd.DataFrame) -> int:
-        """Simple fallback prediction logic for testing"""
-        # Simple logic based on creatinine levels
-        creatinine = df['Créatinine (mg/L)'].values[0]
+        X = self._build_features(patients)
         
-        if creatinine > 200:
-            stage = 5
-        elif creatinine > 100:
-            stage = 4
-        elif creatinine > 50:
-            stage = 3
-        elif creatinine > 20:
-            stage = 2
-        elif creatinine > 15:
-            stage = 1
+        if hasattr(self._model, 'predict_proba'):
+            # A forest's predict() is argmax(predict_proba()): walk the trees once
+            probas = self._model.predict_proba(X)
+            stages = self._classes_int[probas.argmax(axis=1)].tolist()
+            classes = self._classes_int.tolist()
+            probabilities = [dict(zip(classes, row)) for row in probas.tolist()]
         else:
-            stage = 0
-            
-        # Generate probabilities and feature importance for fallback
-        self._generate_fallback_probabilities(stage)
-        self._generate_fallback_feature_importance(df)
+            # Make prediction using the real model, with fallback probabilities
+            predictions = self._model.predict(X)
+            stages = [int(prediction) for prediction in predictions]
+            probabilities = [self._generate_fallback_probabilities(stage) for stage in stages]
         
-        return stage
+        return stages, probabilities, self._feature_importance_cached
     
-    def _generate_fallback_probabilities(self, predicted_stage: int) -> None:
-        """Generate fallback probabilities for testing"""
-        # Give the predicted stage a high probability and distribute the rest
-        confidence = 0.75 + (np.random.random() * 0.2)  # Between 0.75 and 0.95
-        remaining = 1.0 - confidence
-        
-        self._stage_probabilities = {
-            0: 0.0,
-            1: 0.0,
-            2: 0.0,
-            3: 0.0,
-            4: 0.0,
-            5: 0.0
-        }
+    def _build_features(self, patients: List[PredictionInput]) -> Any:
+        """
+        Convert patients into the model input, in feature order.
+        A single row is written into a per-thread preallocated row buffer
+        (and its template DataFrame for models needing column names), which
+        is only valid until the next call from the same thread.
+        """
+        if len(patients) == 1:
+            row_buf = getattr(self._row_buf, 'value', None)
+            if row_buf is None:
+                # float32 is the dtype sklearn trees work with
+                row_buf = self._row_buf.value = np.zeros((1, self._n_features), dtype=np.float32)
+                if self._needs_dataframe:
+                    # The frame wraps row_buf without copying, so writes show up in it
+                    self._row_buf.frame = pd.DataFrame(row_buf, columns=self._feature_order, copy=False)
+            
+            patient = patients[0]
+            for i, field in enumerate(self._feature_fields):
+                row_buf[0, i] = getattr(patient, field)
+            return self._row_buf.frame if self._needs_dataframe else row_buf
         
-        # Set the confidence for the predicted stage
-        self._stage_probabilities[predicted_stage] = confidence
+        if self._needs_dataframe:
+            return self._to_dataframe(patients)
         
-        # Distribute remaining probability among other stages
-        other_stages = [s for s in range(6) if s != predicted_stage]
-        for stage in other_stages:
-            self._stage_probabilities[stage] = remaining / len(other_stages)
+        return np.array(
+            [[getattr(patient, field) for field in self._feature_fields] for patient in patients],
+            dtype=np.float32
+        )
+    
+    def _to_dataframe(self, patients: List[PredictionInput]) -> pd.DataFrame:
+        """Build a DataFrame of the patients with the model's column names"""
+        return pd.DataFrame(
+            [[getattr(patient, field) for field in self._feature_fields] for patient in patients],
+            columns=self._feature_order
+        )
     
-    def _calculate_feature_importance(self, df: pd.DataFrame) -> None:
-        """Calculate feature importance based on the model"""
+    def _generate_fallback_probabilities(self, predicted_stage: int) -> Dict[int, float]:
+        """Fallback probabilities for models without predict_proba"""
+        return dict(zip(range(6), _FALLBACK_PROBAS[predicted_stage].tolist()))
+    
+    def _calculate_feature_importance(self) -> Dict[str, float]:
+        """Calculate feature importance based on the model, normalized to sum to 1"""
         try:
             if hasattr(self._model, 'feature_importances_'):
-                # Get feature names
-                feature_names = df.columns.tolist()
-                
-                # Get feature importances from model
-                importances = self._model.feature_importances_
-                
-                # Create a dictionary of feature importances
-                self._feature_importance = {
-                    feature_names[i]: float(importances[i]) 
-                    for i in range(len(feature_names))
-                }
-                
-                # Normalize to sum to 1
-                total = sum(self._feature_importance.values())
-                self._feature_importance = {
-                    k: v/total for k, v in self._feature_importance.items()
-                }
+                importances = np.asarray(self._model.feature_importances_, dtype=np.float64)
+                importances = importances / importances.sum()
+                return dict(zip(self._feature_order, importances.tolist()))
             else:
-                self._generate_fallback_feature_importance(df)
-        except Exception as e:
-            print(f"Error calculating feature importance: {e}")
-            self._generate_fallback_feature_importance(df)
-    
-    def _generate_fallback_feature_importance(self, df: pd.DataFrame) -> None:
-        """Generate fallback feature importance for testing"""
-        # Create a dictionary mapping feature names to importance values
-        features = list(df.columns)
-        
-        # Assign higher importance to creatinine and urea
-        self._feature_importance = {
-            "Créatinine (mg/L)": 0.35,
-            "Urée (g/L)": 0.25,
-            "Age": 0.15,
-            "TA (mmHg)/Systole": 0.10,
-            "Na^+ (meq/L)": 0.05,
-            "Score de Glasgow (/15)": 0.05,
-            "Sexe_M": 0.02,
-            "Anémie_True": 0.03,
-            "Choc de Pointe/Perçu": 0.02,
-            "Enquête Sociale/Tabac_True": 0.015,
-            "Enquête Sociale/Alcool_True": 0.015
-        }
-        
-        # Make sure we're only using features that are actually in the input
-        self._feature_importance = {
-            k: v for k, v in self._feature_importance.items() if k in features
-        }
-        
-        # Normalize to sum to 1
-        total = sum(self._feature_importance.values())
-        self._feature_importance = {
-            k: v/total for k, v in self._feature_importance.items()
-        }
-    
-    def get_stage_probabilities(self) -> Dict[int, float]:
-        """Get the probability distribution across all stages"""
-        return self._stage_probabilities if self._stage_probabilities else {}
-    
-    def get_feature_importance(self) -> Dict[str, float]:
-        """Get the feature importance scores"""
-        return self._feature_importance if self._feature_importance else {}
+                return self._generate_fallback_feature_importance(self._feature_order)
+        except Exception:
+            logger.exception("Error calculating feature importance")
+            return self._generate_fallback_feature_importance(self._feature_order)
+    
+    def _generate_fallback_feature_importance(self, features: Iterable[str]) -> Dict[str, float]:
+        """Fallback feature importance for models without feature_importances_"""
+        return _fallback_importance_for(frozenset(features))
     
     def get_status(self) -> Dict[str, Any]:
         """Get the current status of the model"""
@@ -0,0 +1,34 @@
+import numpy as np
+from pathlib import Path
+from typing import Any
+
+# Optional dependency: only needed when a compiled model exists (see compile_model.py)
+try:
+    import treelite_runtime
+except ImportError:
+    treelite_runtime = None
+
+class TreelitePredictor:
+    """
+    Native tree ensemble compiled with Treelite, exposing the subset of the
+    sklearn classifier API used by LazyIRCModel (classes_, predict, predict_proba)
+    """
+    def __init__(self, lib_path: Path, classes: np.ndarray):
+        # One thread per call: requests are already spread over the prediction pool
+        self._predictor = treelite_runtime.Predictor(str(lib_path), nthread=1)
+        self.classes_ = classes
+
+    @staticmethod
+    def is_available(lib_path: Path) -> bool:
+        """Check that the runtime is installed and the model has been compiled"""
+        return treelite_runtime is not None and lib_path.is_file()
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        """Class probabilities, averaged over the trees as sklearn does"""
+        dmat = treelite_runtime.DMatrix(np.asarray(X, dtype=np.float32), dtype='float32')
+        probas = self._predictor.predict(dmat)
+        return np.asarray(probas).reshape(-1, self.classes_.size)
+
+    def predict(self, X: Any) -> np.ndarray:
+        """Predicted class labels"""
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
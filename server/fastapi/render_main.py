@@ -1,10 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, ConfigDict
 from typing import List, Dict, Any, Optional
+import os
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import uvicorn
 import numpy as np
-from lazy_model import LazyIRCModel
+from lazy_model import LazyIRCModel, ModelNotReadyError
+from batcher import PredictionBatcher
+from schemas import PredictionInput
 
 # Initialize the FastAPI app
 app = FastAPI(
@@ -22,42 +28,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load the model on startup (in background)
+# Application logs go to stderr; once serving, handlers run in a listener thread
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log_queue = queue.SimpleQueue()
+log_listener: Optional[QueueListener] = None
+
+@app.on_event("startup")
+async def start_log_listener():
+    # Request threads only enqueue records, the stream I/O happens off the request path
+    global log_listener
+    root = logging.getLogger()
+    log_listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(log_queue)]
+    log_listener.start()
+
+@app.on_event("shutdown")
+async def stop_log_listener():
+    # Give the original handlers back so a later startup wraps them, not the QueueHandler
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        logging.getLogger().handlers = list(log_listener.handlers)
+        log_listener = None
+
+# Model is loaded by the startup event below, or right away when the app
+# is preloaded by gunicorn so that all workers share the loaded forest
 model = LazyIRCModel()
+if os.environ.get("PRELOAD_MODEL") == "1":
+    model.load()
 
-# Input data model
-class PredictionInput(BaseModel):
-    """Input data for IRC stage prediction"""
-    créatinine_mg_L: float = Field(alias="Créatinine (mg/L)", description="Blood creatinine level in mg/L")
-    urée_g_L: float = Field(alias="Urée (g/L)", description="Blood urea level in g/L")
-    age: int = Field(alias="Age", description="Patient's age in years")
-    sodium_meq_L: float = Field(alias="Na^+ (meq/L)", description="Blood sodium level in meq/L")
-    ta_systole: float = Field(alias="TA (mmHg)/Systole", description="Systolic blood pressure in mmHg")
-    choc_de_pointe: int = Field(alias="Choc de Pointe/Perçu", description="Presence of shock, 0 or 1")
-    sexe_M: int = Field(alias="Sexe_M", description="Gender: 1 for male, 0 for female")
-    anémie_true: int = Field(alias="Anémie_True", description="Presence of anemia: 1 if present, 0 otherwise")
-    glasgow: float = Field(alias="Score de Glasgow (/15)", description="Glasgow score on a scale of 3 to 15")
-    tabac_true: int = Field(alias="Enquête Sociale/Tabac_True", description="Tobacco use: 1 if yes, 0 if no")
-    alcool_true: int = Field(alias="Enquête Sociale/Alcool_True", description="Alcohol consumption: 1 if yes, 0 if no")
+# Group concurrent predictions into a single model call
+batcher = PredictionBatcher(model)
 
-    model_config = ConfigDict(
-        populate_by_name=True,
-        json_schema_extra={
-            "example": {
-                "Créatinine (mg/L)": 42.0,
-                "Urée (g/L)": 1.14,
-                "Age": 68,
-                "Na^+ (meq/L)": 142.0,
-                "TA (mmHg)/Systole": 130.0,
-                "Choc de Pointe/Perçu": 0,
-                "Sexe_M": 1,
-                "Anémie_True": 1,
-                "Score de Glasgow (/15)": 15.0,
-                "Enquête Sociale/Tabac_True": 0,
-                "Enquête Sociale/Alcool_True": 1
-            }
-        }
-    )
+@app.on_event("startup")
+async def load_model():
+    await model.ensure_loaded()
+
+@app.on_event("startup")
+async def start_batcher():
+    await batcher.start()
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
 
 # Stage probability model
 class StageProbability(BaseModel):
@@ -111,33 +124,16 @@ async def model_status():
 @app.post("/predict", response_model=PredictionOutput)
 async def predict(input_data: PredictionInput):
     try:
-        # Convert input to the format expected by the model
-        input_dict = {
-            'Créatinine (mg/L)': input_data.créatinine_mg_L,
-            'Urée (g/L)': input_data.urée_g_L,
-            'Age': input_data.age,
-            'Na^+ (meq/L)': input_data.sodium_meq_L,
-            'TA (mmHg)/Systole': input_data.ta_systole,
-            'Choc de Pointe/Perçu': input_data.choc_de_pointe,
-            'Score de Glasgow (/15)': input_data.glasgow,
-            'Sexe_M': input_data.sexe_M,
-            'Anémie_True': input_data.anémie_true,
-            'Enquête Sociale/Tabac_True': input_data.tabac_true,
-            'Enquête Sociale/Alcool_True': input_data.alcool_true
-        }
-        
-        # Make prediction
-        prediction_result = model.predict(input_dict)
+        # Make prediction (batched with concurrent requests)
+        prediction_result, probabilities, feature_imp = await batcher.submit(input_data)
         
         # Get stage probabilities
-        probabilities = model.get_stage_probabilities()
         stage_probs = [
             StageProbability(stage=stage, probability=prob)
             for stage, prob in probabilities.items()
         ]
         
         # Get feature importance
-        feature_imp = model.get_feature_importance()
         feature_importance = [
             FeatureImportance(feature=feat, importance=imp)
             for feat, imp in feature_imp.items()
@@ -151,6 +147,8 @@ async def predict(input_data: PredictionInput):
             feature_importance=feature_importance
         )
     
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
@@ -0,0 +1,40 @@
+from pydantic import BaseModel, Field, ConfigDict
+
+# Input data model
+class PredictionInput(BaseModel):
+    """
+    Input data for IRC stage prediction. Values outside physiological ranges
+    (and NaN/infinity) are rejected here, the model cannot score them.
+    """
+    créatinine_mg_L: float = Field(alias="Créatinine (mg/L)", ge=0, le=2000, description="Blood creatinine level in mg/L")
+    urée_g_L: float = Field(alias="Urée (g/L)", ge=0, le=50, description="Blood urea level in g/L")
+    age: int = Field(alias="Age", ge=0, le=120, description="Patient's age in years")
+    sodium_meq_L: float = Field(alias="Na^+ (meq/L)", ge=80, le=200, description="Blood sodium level in meq/L")
+    ta_systole: float = Field(alias="TA (mmHg)/Systole", ge=0, le=300, description="Systolic blood pressure in mmHg")
+    choc_de_pointe: int = Field(alias="Choc de Pointe/Perçu", ge=0, le=1, description="Presence of shock, 0 or 1")
+    sexe_M: int = Field(alias="Sexe_M", ge=0, le=1, description="Gender: 1 for male, 0 for female")
+    anémie_true: int = Field(alias="Anémie_True", ge=0, le=1, description="Presence of anemia: 1 if present, 0 otherwise")
+    glasgow: float = Field(alias="Score de Glasgow (/15)", ge=3, le=15, description="Glasgow score on a scale of 3 to 15")
+    tabac_true: int = Field(alias="Enquête Sociale/Tabac_True", ge=0, le=1, description="Tobacco use: 1 if yes, 0 if no")
+    alcool_true: int = Field(alias="Enquête Sociale/Alcool_True", ge=0, le=1, description="Alcohol consumption: 1 if yes, 0 if no")
+
+    model_config = ConfigDict(
+        populate_by_name=True,
+        extra='forbid',
+        allow_inf_nan=False,
+        json_schema_extra={
+            "example": {
+                "Créatinine (mg/L)": 42.0,
+                "Urée (g/L)": 1.14,
+                "Age": 68,
+                "Na^+ (meq/L)": 142.0,
+                "TA (mmHg)/Systole": 130.0,
+                "Choc de Pointe/Perçu": 0,
+                "Sexe_M": 1,
+                "Anémie_True": 1,
+                "Score de Glasgow (/15)": 15.0,
+                "Enquête Sociale/Tabac_True": 0,
+                "Enquête Sociale/Alcool_True": 1
+            }
+        }
+    )
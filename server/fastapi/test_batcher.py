@@ -0,0 +1,64 @@
+import asyncio
+
+from batcher import PredictionBatcher
+
+class FakeModel:
+    """Scores integers as stage = value, rejecting any batch holding a negative value"""
+    def __init__(self):
+        self.calls = []
+
+    async def apredict_batch(self, patients):
+        self.calls.append(list(patients))
+        if any(patient < 0 for patient in patients):
+            raise ValueError("Input X contains infinity")
+        return list(patients), [{patient: 1.0} for patient in patients], {"feature": 1.0}
+
+def run_batch(model, patients):
+    """Submit all patients at once and return the result (or exception) of each"""
+    async def main():
+        batcher = PredictionBatcher(model, max_batch_size=32, max_wait=0.05)
+        await batcher.start()
+        try:
+            return await asyncio.gather(
+                *[batcher.submit(patient) for patient in patients], return_exceptions=True
+            )
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+def test_batch_is_scored_in_one_call():
+    model = FakeModel()
+    results = run_batch(model, list(range(10)))
+
+    assert [stage for stage, _, _ in results] == list(range(10))
+    assert len(model.calls) == 1
+
+def test_poisoned_row_only_fails_its_own_request():
+    model = FakeModel()
+    patients = [0, 1, 2, 3, -1, 5, 6, 7, 8, 9]
+    results = run_batch(model, patients)
+
+    for patient, result in zip(patients, results):
+        if patient < 0:
+            assert isinstance(result, ValueError)
+        else:
+            stage, probabilities, feature_importance = result
+            assert stage == patient
+            assert probabilities == {patient: 1.0}
+
+def test_stop_cancels_pending_requests():
+    class SlowModel(FakeModel):
+        async def apredict_batch(self, patients):
+            await asyncio.sleep(10)
+
+    async def main():
+        batcher = PredictionBatcher(SlowModel(), max_batch_size=2, max_concurrency=1)
+        await batcher.start()
+        # One batch in flight, one waiting for a slot, one left in the queue
+        pending = [asyncio.ensure_future(batcher.submit(patient)) for patient in range(5)]
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        return await asyncio.wait_for(asyncio.gather(*pending, return_exceptions=True), 1)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
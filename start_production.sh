@@ -34,6 +34,7 @@ if [[ -n "$DYNO" || -n "$RENDER" ]]; then
     exec gunicorn main:app \
         --worker-class uvicorn.workers.UvicornWorker \
         --workers $WORKERS \
+        --preload \
         --bind $HOST:$PORT \
         --access-logfile - \
         --error-logfile -
@@ -42,6 +43,7 @@ else
     exec gunicorn main:app \
         --worker-class uvicorn.workers.UvicornWorker \
         --workers $WORKERS \
+        --preload \
         --bind $HOST:$PORT \
         --access-logfile - \
         --error-logfile -